@@ -1,16 +1,31 @@
-import os
+import hashlib
+import functools
 import uvicorn
+import orjson
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from fastapi import FastAPI, HTTPException, Depends, Header, Query
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from types import MappingProxyType
+from typing import AsyncIterator, Dict, Mapping, Optional
 from enum import Enum
-from sqlalchemy.orm import Session
-from database import get_db, Event, SessionLocal, validate_and_use_token, SGT
+from sqlalchemy import select, update, func, and_, or_, true
+from sqlalchemy.engine import RowMapping
+from sqlalchemy.ext.asyncio import AsyncMappingResult, AsyncSession
+from database import async_engine, get_db, get_sgt_now_naive, Event, validate_and_use_token
 
-app = FastAPI(title="EventSort API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Close the async engine's pooled connections on shutdown (aiosqlite's worker threads would keep the process alive)"""
+    yield
+    await async_engine.dispose()
+
+app = FastAPI(title="EventSort API", version="1.0.0", default_response_class=ORJSONResponse, lifespan=lifespan)
 PORT = 8000 # set during deployment
+STREAM_BATCH_SIZE = 128 # rows fetched per round-trip when streaming event lists
 
 # Enable CORS so React frontend can call this API
 app.add_middleware(
@@ -53,10 +68,9 @@ class EventResponse(BaseModel):
     key_speakers: Optional[str]
     raw_message: Optional[str] = None  # Only included if requested
     user_interested: Optional[bool]
-    date_created: str
+    date_created: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class SwipeRequest(BaseModel):
@@ -69,67 +83,93 @@ class AuthResponse(BaseModel):
     message: str
 
 
-# Helper function to parse event dates
-def parse_event_date(date_str: str) -> Optional[datetime]:
+# Columns returned for a single event (raw_message is appended on request)
+EVENT_COLUMNS = (
+    Event.id,
+    Event.user_id,
+    Event.username,
+    Event.title,
+    Event.event_type,
+    Event.date,
+    Event.location,
+    Event.synopsis,
+    Event.organisation,
+    Event.fee,
+    Event.signup_link,
+    Event.deadline,
+    Event.target_audience,
+    Event.refreshments,
+    Event.key_speakers,
+    Event.user_interested,
+    Event.date_created,
+)
+
+
+def select_events(include_raw: bool = False):
+    """Core SELECT over the event response columns (no ORM objects)"""
+    columns = EVENT_COLUMNS + (Event.raw_message,) if include_raw else EVENT_COLUMNS
+    return select(*columns)
+
+
+def select_event_json(include_raw: bool = False):
+    """SELECT of each event's stored response_json plus the fields that are added at read time"""
+    columns = (Event.id, Event.user_interested, Event.date_created, Event.response_json)
+    return select(*columns, Event.raw_message) if include_raw else select(*columns)
+
+
+def event_json(event: RowMapping) -> bytes:
     """
-    Attempt to parse various date formats from event dates.
-    Returns None if parsing fails.
+    One event's JSON from its stored response_json (see select_event_json).
+    The row's id/user_interested/date_created (and raw_message) are spliced
+    onto the stored object, so the static fields are never re-serialized.
     """
-    if not date_str or date_str.lower() in ['tbc', 'ongoing', 'none']:
-        return None
-    
-    # Common formats in your events
-    formats = [
-        "%d %b %Y, %I:%M %p",  # "4 Nov 2025, 5:30 PM"
-        "%d %b %Y",  # "4 Nov 2025"
-        "%d-%d %b %Y",  # "8-9 Nov 2025"
-        "%d %b, %I:%M %p",  # "4 Nov, 5:30 PM" (assume current year)
-    ]
-    
-    for fmt in formats:
-        try:
-            parsed = datetime.strptime(date_str.split(',')[0].strip(), fmt.split(',')[0])
-            # If year not in string, assume current year
-            if parsed.year == 1900:
-                parsed = parsed.replace(year=datetime.now().year)
-            return parsed
-        except:
-            continue
-    
-    return None
+    fields = dict(event)
+    stored = fields.pop("response_json")
+    return orjson.dumps(fields, option=orjson.OPT_UTC_Z)[:-1] + b"," + stored[1:] # "Z" suffix, as pydantic does
 
 
-def filter_events_by_date(events: List[Event], filter_type: EventFilter) -> List[Event]:
-    """Filter events based on date criteria"""
+async def stream_event_list(events: AsyncMappingResult) -> AsyncIterator[bytes]:
+    """Yield a JSON array of events, one chunk per batch of rows fetched from the DB cursor"""
+    separator = b"["
+    async for partition in events.partitions():
+        yield separator + b",".join(event_json(event) for event in partition)
+        separator = b","
+    yield b"[]" if separator == b"[" else b"]"
+
+
+def event_list_response(events: AsyncMappingResult, headers: Optional[Mapping[str, str]] = None) -> StreamingResponse:
+    """Stream events as a JSON array, so the full payload is never held in memory"""
+    return StreamingResponse(stream_event_list(events), media_type="application/json", headers=headers)
+
+
+def date_filter_clause(filter_type: EventFilter):
+    """SQL condition for a date filter, evaluated against the indexed event_date_parsed column"""
     if filter_type == EventFilter.ALL:
-        return events
+        return true()
     
-    now = datetime.now(SGT).replace(tzinfo=None)
-    filtered = []
+    now = get_sgt_now_naive()
     
-    for event in events:
-        event_date = parse_event_date(event.date)
-        
-        if not event_date:
-            # If can't parse date, include in "upcoming" but not "urgent"
-            if filter_type == EventFilter.UPCOMING:
-                filtered.append(event)
-            continue
-        
-        if filter_type == EventFilter.UPCOMING:
-            if event_date >= now:
-                filtered.append(event)
-        
-        elif filter_type == EventFilter.URGENT:
-            week_from_now = now + timedelta(days=7)
-            if now <= event_date <= week_from_now:
-                filtered.append(event)
+    if filter_type == EventFilter.UPCOMING:
+        # If can't parse date, include in "upcoming" but not "urgent"
+        return or_(Event.event_date_parsed.is_(None), Event.event_date_parsed >= now)
     
-    return filtered
+    # URGENT: happening within the next 7 days
+    return Event.event_date_parsed.between(now, now + timedelta(days=7))
+
+
+# Parsed Authorization headers -> user_id, so repeat requests skip re-parsing
+AUTH_CACHE_SIZE = 4096
+_AUTH_CACHE: Dict[str, int] = {}
 
 
-# Dependency to get current user from token
-def get_current_user(authorization: Optional[str] = Header(None)):
+@functools.lru_cache(maxsize=AUTH_CACHE_SIZE)
+def _make_user(user_id: int) -> Mapping[str, int]:
+    """Shared read-only current_user mapping per user_id (no dict allocated per request)"""
+    return MappingProxyType({"user_id": user_id})
+
+
+# Dependency to get current user from token (async: no I/O, so it runs inline rather than in the threadpool)
+async def get_current_user(authorization: Optional[str] = Header(None)) -> Mapping[str, int]:
     """
     Validate user session. 
     Expects Authorization header with format: "Bearer <user_id>"
@@ -144,21 +184,13 @@ def get_current_user(authorization: Optional[str] = Header(None)):
             }
         )
     
-    try:
-        # Extract user_id from "Bearer <user_id>"
-        scheme, user_id = authorization.split()
-        if scheme.lower() != "bearer":
-            raise HTTPException(
-                status_code=401,
-                detail={
-                    "error": "Invalid authentication scheme",
-                    "code": "INVALID_AUTH_SCHEME",
-                    "status": 401
-                }
-            )
-        
-        return {"user_id": int(user_id)}
-    except:
+    user_id = _AUTH_CACHE.get(authorization)
+    if user_id is not None:
+        return _make_user(user_id)
+    
+    # Extract user_id from "Bearer <user_id>" (plain branching, no exceptions on the hot path)
+    parts = authorization.split(maxsplit=1)
+    if len(parts) != 2 or not parts[1].isdecimal():
         raise HTTPException(
             status_code=401,
             detail={
@@ -167,24 +199,75 @@ def get_current_user(authorization: Optional[str] = Header(None)):
                 "status": 401
             }
         )
+    
+    if parts[0].lower() != "bearer":
+        raise HTTPException(
+            status_code=401,
+            detail={
+                "error": "Invalid authentication scheme",
+                "code": "INVALID_AUTH_SCHEME",
+                "status": 401
+            }
+        )
+    
+    user_id = int(parts[1])
+    if len(_AUTH_CACHE) >= AUTH_CACHE_SIZE:
+        del _AUTH_CACHE[next(iter(_AUTH_CACHE))]  # evict the oldest entry
+    _AUTH_CACHE[authorization] = user_id
+    return _make_user(user_id)
+
+
+# Dependency for HTTP caching of the polled endpoints
+async def events_etag(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: Mapping[str, int] = Depends(get_current_user)
+) -> Dict[str, str]:
+    """
+    Fingerprint the user's events with one cheap aggregate query.
+    Raises 304 Not Modified if it matches the client's If-None-Match,
+    otherwise returns the caching headers for the response.
+    """
+    user_id = current_user["user_id"]
+    
+    # Any insert or swipe changes at least one of these
+    result = await db.execute(
+        select(
+            func.max(Event.date_created),
+            func.count(),
+            func.count().filter(Event.user_interested.is_(None)),
+            func.count().filter(Event.user_interested.is_(True)),
+        ).where(Event.user_id == user_id)
+    )
+    # Date filters only move at midnight (parsed dates have no time), so include today's date
+    today = get_sgt_now_naive().date()
+    fingerprint = f"{user_id}:{today}:{tuple(result.one())}"
+    etag = f'"{hashlib.blake2b(fingerprint.encode(), digest_size=8).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        raise HTTPException(status_code=304, headers=headers)
+    
+    return headers
 
 
 # API Endpoints
 
 @app.get("/")
-def read_root():
+async def read_root():
     """Health check endpoint"""
     return {"status": "healthy", "message": "EventBot API is running"}
 
 
 @app.post("/auth/validate-token", response_model=AuthResponse)
-def validate_token(token: str):
+async def validate_token(token: str, db: AsyncSession = Depends(get_db)):
     """
     Validate a one-time token from Telegram bot.
     Returns user info and marks token as used.
     Frontend should call this on page load with token from URL.
     """
-    user_info = validate_and_use_token(token)
+    user_info = await validate_and_use_token(db, token)
     
     if not user_info:
         raise HTTPException(
@@ -203,12 +286,13 @@ def validate_token(token: str):
     }
 
 
-@app.get("/events", response_model=List[EventResponse])
-def get_events(
+@app.get("/events")
+async def get_events(
     filter: EventFilter = Query(EventFilter.UPCOMING, description="Filter events by date"),
     include_raw: bool = Query(False, description="Include raw message text"),
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Mapping[str, int] = Depends(get_current_user),
+    cache_headers: Dict[str, str] = Depends(events_etag)
 ):
     """
     Get unread events for the authenticated user.
@@ -222,60 +306,34 @@ def get_events(
     user_id = current_user["user_id"]
     
     # Get events for this user that haven't been swiped
-    events = db.query(Event)\
-        .filter(Event.user_id == user_id)\
-        .filter(Event.user_interested == None)\
-        .order_by(Event.date_created.desc())\
-        .all()
-    
-    # Apply date filtering
-    events = filter_events_by_date(events, filter)
+    result = await db.stream(
+        select_event_json(include_raw)
+        .where(Event.user_id == user_id)
+        .where(Event.user_interested.is_(None))
+        .where(date_filter_clause(filter))
+        .order_by(Event.date_created.desc())
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
     
-    # Convert to response models, conditionally including raw_message
-    response = []
-    for event in events:
-        event_dict = {
-            "id": event.id,
-            "user_id": event.user_id,
-            "username": event.username,
-            "title": event.title,
-            "event_type": event.event_type,
-            "date": event.date,
-            "location": event.location,
-            "synopsis": event.synopsis,
-            "organisation": event.organisation,
-            "fee": event.fee,
-            "signup_link": event.signup_link,
-            "deadline": event.deadline,
-            "target_audience": event.target_audience,
-            "refreshments": event.refreshments,
-            "key_speakers": event.key_speakers,
-            "user_interested": event.user_interested,
-            "date_created": str(event.date_created)
-        }
-        
-        if include_raw:
-            event_dict["raw_message"] = event.raw_message
-        
-        response.append(EventResponse(**event_dict))
-    
-    return response
+    return event_list_response(result.mappings(), cache_headers)
 
 
 @app.get("/events/{event_id}", response_model=EventResponse)
-def get_event(
+async def get_event(
     event_id: int,
     include_raw: bool = Query(True, description="Include raw message text"),
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Mapping[str, int] = Depends(get_current_user)
 ):
     """Get a specific event by ID (must belong to authenticated user)"""
     user_id = current_user["user_id"]
     
-    event = db.query(Event)\
-        .filter(Event.id == event_id)\
-        .filter(Event.user_id == user_id)\
-        .first()
+    result = await db.execute(
+        select_events(include_raw)
+        .where(Event.id == event_id)
+        .where(Event.user_id == user_id)
+    )
+    event = result.mappings().first()
     
     if not event:
         raise HTTPException(
@@ -287,39 +345,18 @@ def get_event(
             }
         )
     
-    # Build response
-    event_dict = {
-        "id": event.id,
-        "user_id": event.user_id,
-        "username": event.username,
-        "title": event.title,
-        "event_type": event.event_type,
-        "date": event.date,
-        "location": event.location,
-        "synopsis": event.synopsis,
-        "organisation": event.organisation,
-        "fee": event.fee,
-        "signup_link": event.signup_link,
-        "deadline": event.deadline,
-        "target_audience": event.target_audience,
-        "refreshments": event.refreshments,
-        "key_speakers": event.key_speakers,
-        "user_interested": event.user_interested,
-        "date_created": str(event.date_created)
-    }
-    
-    if include_raw:
-        event_dict["raw_message"] = event.raw_message
-    
-    return EventResponse(**event_dict)
+    # DB rows are trusted: build the model without validation, and return a Response
+    # directly so FastAPI doesn't revalidate it against response_model
+    response = EventResponse.model_construct(**event)
+    return ORJSONResponse(content=response.model_dump(mode="json"))
 
 
 @app.post("/events/{event_id}/swipe")
-def swipe_event(
+async def swipe_event(
     event_id: int,
     swipe: SwipeRequest,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Mapping[str, int] = Depends(get_current_user)
 ):
     """
     Record user's swipe on an event.
@@ -328,12 +365,19 @@ def swipe_event(
     """
     user_id = current_user["user_id"]
     
-    event = db.query(Event)\
-        .filter(Event.id == event_id)\
-        .filter(Event.user_id == user_id)\
-        .first()
+    # Update user interest in one round-trip; no row back means no such event for this user
+    result = await db.execute(
+        update(Event)
+        .where(Event.id == event_id)
+        .where(Event.user_id == user_id)
+        .values(user_interested=swipe.interested)
+        .returning(Event.id)
+        .execution_options(synchronize_session=False)
+    )
+    updated = result.first()
+    await db.commit()
     
-    if not event:
+    if not updated:
         raise HTTPException(
             status_code=404,
             detail={
@@ -343,11 +387,6 @@ def swipe_event(
             }
         )
     
-    # Update user interest
-    event.user_interested = swipe.interested
-    db.commit()
-    db.refresh(event)
-    
     return {
         "success": True,
         "event_id": event_id,
@@ -356,78 +395,50 @@ def swipe_event(
     }
 
 
-@app.get("/events/interested/all", response_model=List[EventResponse])
-def get_interested_events(
+@app.get("/events/interested/all")
+async def get_interested_events(
     include_raw: bool = Query(False, description="Include raw message text"),
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Mapping[str, int] = Depends(get_current_user),
+    cache_headers: Dict[str, str] = Depends(events_etag)
 ):
     """Get all events the user swiped right on (interested)"""
     user_id = current_user["user_id"]
     
-    events = db.query(Event)\
-        .filter(Event.user_id == user_id)\
-        .filter(Event.user_interested == True)\
-        .order_by(Event.date_created.desc())\
-        .all()
+    result = await db.stream(
+        select_event_json(include_raw)
+        .where(Event.user_id == user_id)
+        .where(Event.user_interested.is_(True))
+        .order_by(Event.date_created.desc())
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
     
-    # Convert to response models
-    response = []
-    for event in events:
-        event_dict = {
-            "id": event.id,
-            "user_id": event.user_id,
-            "username": event.username,
-            "title": event.title,
-            "event_type": event.event_type,
-            "date": event.date,
-            "location": event.location,
-            "synopsis": event.synopsis,
-            "organisation": event.organisation,
-            "fee": event.fee,
-            "signup_link": event.signup_link,
-            "deadline": event.deadline,
-            "target_audience": event.target_audience,
-            "refreshments": event.refreshments,
-            "key_speakers": event.key_speakers,
-            "user_interested": event.user_interested,
-            "date_created": str(event.date_created)
-        }
-        
-        if include_raw:
-            event_dict["raw_message"] = event.raw_message
-        
-        response.append(EventResponse(**event_dict))
-    
-    return response
+    return event_list_response(result.mappings(), cache_headers)
 
 
 @app.get("/stats")
-def get_stats(
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user)
+async def get_stats(
+    db: AsyncSession = Depends(get_db),
+    current_user: Mapping[str, int] = Depends(get_current_user),
+    cache_headers: Dict[str, str] = Depends(events_etag)
 ):
     """Get statistics about events for authenticated user"""
     user_id = current_user["user_id"]
     
-    query = db.query(Event).filter(Event.user_id == user_id)
-    
-    total = query.count()
-    interested = query.filter(Event.user_interested == True).count()
-    not_interested = query.filter(Event.user_interested == False).count()
-    pending = query.filter(Event.user_interested == None).count()
-    
-    # Get urgent events count (within 7 days)
-    all_events = query.filter(Event.user_interested == None).all()
-    urgent = len(filter_events_by_date(all_events, EventFilter.URGENT))
+    # One aggregate query instead of a COUNT per category
+    pending = Event.user_interested.is_(None)
+    result = await db.execute(
+        select(
+            func.count().label("total_events"),
+            func.count().filter(Event.user_interested.is_(True)).label("interested"),
+            func.count().filter(Event.user_interested.is_(False)).label("not_interested"),
+            func.count().filter(pending).label("pending_swipes"),
+            # Urgent events: pending and within the next 7 days
+            func.count().filter(and_(pending, date_filter_clause(EventFilter.URGENT))).label("urgent_events"),
+        ).where(Event.user_id == user_id)
+    )
     
-    return {
-        "total_events": total,
-        "interested": interested,
-        "not_interested": not_interested,
-        "pending_swipes": pending,
-        "urgent_events": urgent
-    }
+    return ORJSONResponse(content=dict(result.one()._mapping), headers=cache_headers)
 
 
 if __name__ == "__main__":
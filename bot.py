@@ -1,13 +1,29 @@
 import os
-from telegram import Update
+import asyncio
+import functools
+from typing import NamedTuple, Optional
+from telegram import Bot, Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
 from dotenv import load_dotenv
-from claude import extract_event_details, format_event_for_display, clean_event_data
-from database import save_event, create_auth_token
+from claude import extract_event_details_batch, format_event_for_display, clean_event_data
+from database import SessionLocal, async_engine, build_event_row, save_events_bulk, create_auth_token
 
-load_dotenv()
-TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
-WEB_URL = os.getenv("API_URL")
+SAVE_BATCH_SIZE = 32 # max events per database write
+SAVE_FLUSH_INTERVAL = 0.2 # seconds to wait for more events before writing a batch
+EXTRACT_BATCH_SIZE = 5 # max messages per Claude call (output budget scales with MAX_TOKENS per message)
+EXTRACT_FLUSH_INTERVAL = 0.5 # seconds to wait for more forwards before calling Claude
+EXTRACT_IDLE_TIMEOUT = 60 # seconds before an idle user's extraction queue is torn down
+
+
+class Settings(NamedTuple):
+    telegram_token: Optional[str]
+    web_url: Optional[str]
+
+@functools.lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Read bot settings from the environment (.env is parsed once per process)"""
+    load_dotenv()
+    return Settings(telegram_token=os.getenv("TELEGRAM_TOKEN"), web_url=os.getenv("API_URL"))
 
 
 # --- APP SETUP --- #
@@ -38,25 +54,21 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Check if it's a forwarded message
     if message.forward_origin and text_content:
         print("✅ Detected as forwarded message, extracting...") # checkpoint; remove later
-        await message.reply_text("⏳ Extracting event details...")
-
-        # Extract event details using Claude
-        event_data = extract_event_details(text_content)
-        cleaned_data = clean_event_data(event_data)
+        # Extract event details using Claude (coalesced with this user's other forwards arriving around now),
+        # sending the progress reply while the extraction is underway rather than before it
+        future = queue_extraction(context.bot_data, user.id, text_content)
+        _, event = await asyncio.gather(message.reply_text("⏳ Extracting event details..."), future)
+        cleaned = clean_event_data(event)
 
-        # Save to database
-        try:
-            saved_event = save_event(
-                event_data=cleaned_data,
-                user_id=user.id,
-                username=user.username or "unknown",
-                raw_message=text_content
-            )
-            formatted_result = format_event_for_display(cleaned_data)
-            await message.reply_text(formatted_result) # Reply with event details & save confirmation
-        except Exception as e:
-            print(f"❌ Database error: {e}")
-            await message.reply_text(f"⚠️ Event extracted but couldn't save to database :( Please try again.")
+        # Queue for saving (written in batches in the background) and reply straight away
+        context.bot_data["save_queue"].put_nowait((build_event_row(
+            event=cleaned,
+            user_id=user.id,
+            username=user.username or "unknown",
+            raw_message=text_content
+        ), message.chat_id)) # chat to notify if the save fails
+        formatted_result = format_event_for_display(cleaned)
+        await message.reply_text(formatted_result) # Reply with event details
     elif message.forward_origin:
         print("⚠️ Additional image detected") # Placeholder; might want to handle media later
     else:
@@ -71,10 +83,10 @@ async def sort_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         # Generate one-time token (expires in 5 minutes)
-        token = create_auth_token(user.id, user.username or "unknown")
+        token = await asyncio.to_thread(issue_auth_token, user.id, user.username or "unknown") # DB write off the event loop
         
         # PLACEHOLDER: Replace with your actual web app URL
-        web_url = f"{WEB_URL}?token={token}"
+        web_url = f"{get_settings().web_url}?token={token}"
         
         await update.message.reply_text(
             f"🔗 Click here to sort your events:\n{web_url}\n"
@@ -89,11 +101,177 @@ async def sort_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 
+# --- DATABASE ACCESS --- #
+# Run in worker threads; each call is one session (one pooled connection checkout) for the whole unit of work
+def issue_auth_token(user_id: int, username: str) -> str:
+    with SessionLocal() as db:
+        return create_auth_token(db, user_id, username)
+
+def write_events(rows: list) -> list:
+    """Insert rows in one statement; if that fails, retry them one by one. Returns the rows that couldn't be saved."""
+    with SessionLocal() as db:
+        try:
+            save_events_bulk(db, rows)
+            return []
+        except Exception:
+            if len(rows) == 1:
+                return rows
+        
+        # One bad row (e.g. an over-long value) shouldn't lose everyone else's events
+        failed = []
+        for row in rows:
+            try:
+                save_events_bulk(db, [row])
+            except Exception:
+                failed.append(row)
+        return failed
+
+
+# --- BACKGROUND EXTRACTION --- #
+# Forwards are only batched with the same user's forwards: messages sharing a Claude call can
+# influence each other's extraction, so one user's text must never end up in another user's batch
+def queue_extraction(bot_data: dict, user_id: int, text: str) -> asyncio.Future:
+    """Queue a message for extraction on its user's queue, starting that queue's task if needed"""
+    queues = bot_data["extract_queues"]
+    queue = queues.get(user_id)
+    if queue is None:
+        queue = queues[user_id] = asyncio.Queue()
+        task = asyncio.create_task(flush_extractions(queue, queues, user_id))
+        tasks = bot_data["extract_tasks"]
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    future = asyncio.get_running_loop().create_future()
+    queue.put_nowait((text, future))
+    return future
+
+async def flush_extractions(queue: asyncio.Queue, queues: dict, user_id: int):
+    """
+    Group one user's queued (message, future) pairs into batched Claude calls.
+    Stops on a None sentinel, or after EXTRACT_IDLE_TIMEOUT without messages.
+    """
+    loop = asyncio.get_running_loop()
+    in_flight = set()
+    running = True
+    while running:
+        try:
+            item = await asyncio.wait_for(queue.get(), EXTRACT_IDLE_TIMEOUT)
+        except asyncio.TimeoutError:
+            if queue.empty(): # no await before removal, so nothing can be queued in between
+                del queues[user_id]
+                break
+            continue
+        if item is None:
+            break
+        
+        # Collect more messages until the batch is full or the flush interval has passed
+        batch = [item]
+        deadline = loop.time() + EXTRACT_FLUSH_INTERVAL
+        while len(batch) < EXTRACT_BATCH_SIZE:
+            try:
+                item = await asyncio.wait_for(queue.get(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                running = False
+                break
+            batch.append(item)
+        
+        # Resolve the batch in its own task so the next one can start collecting meanwhile
+        task = asyncio.create_task(resolve_extractions(batch))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    
+    if in_flight:
+        await asyncio.gather(*in_flight)
+
+async def resolve_extractions(batch: list):
+    """Run one batched extraction and hand each result back to its waiting handler"""
+    try:
+        results = await extract_event_details_batch([text for text, _ in batch])
+    except Exception as e:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(e)
+        return
+    for (_, future), event in zip(batch, results):
+        if not future.done():
+            future.set_result(event)
+
+
+# --- BACKGROUND SAVES --- #
+async def flush_saves(queue: asyncio.Queue, bot: Bot):
+    """Drain queued (event row, chat id) pairs and insert them in batches, until a None sentinel is received"""
+    loop = asyncio.get_running_loop()
+    running = True
+    while running:
+        item = await queue.get()
+        if item is None:
+            break
+        
+        # Collect more rows until the batch is full or the flush interval has passed
+        batch = [item]
+        deadline = loop.time() + SAVE_FLUSH_INTERVAL
+        while len(batch) < SAVE_BATCH_SIZE:
+            try:
+                item = await asyncio.wait_for(queue.get(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                running = False
+                break
+            batch.append(item)
+        
+        chats = {id(row): chat_id for row, chat_id in batch}
+        try:
+            failed = await asyncio.to_thread(write_events, [row for row, _ in batch]) # keep the blocking DB write off the event loop
+        except Exception as e: # e.g. couldn't connect at all
+            print(f"❌ Database error: {e}")
+            failed = [row for row, _ in batch]
+        
+        for row in failed:
+            print(f"❌ Event not saved for user {row['user_id']}: {row['title']}")
+            try:
+                await bot.send_message(
+                    chats[id(row)],
+                    f"⚠️ Event \"{row['title']}\" was extracted but couldn't be saved to the database :( Please try again."
+                )
+            except Exception as e:
+                print(f"❌ Couldn't notify user {row['user_id']}: {e}")
+
+async def post_init(app: Application):
+    """Start the background save task once the bot's event loop is running (extraction queues start per user)"""
+    app.bot_data["extract_queues"] = {}
+    app.bot_data["extract_tasks"] = set()
+    save_queue = asyncio.Queue()
+    app.bot_data["save_queue"] = save_queue
+    app.bot_data["save_task"] = asyncio.create_task(flush_saves(save_queue, app.bot))
+
+async def post_stop(app: Application):
+    """Finish in-flight extractions and write any still-queued events (the bot can still notify users of failed saves)"""
+    for queue in app.bot_data["extract_queues"].values():
+        queue.put_nowait(None)
+    await asyncio.gather(*app.bot_data["extract_tasks"])
+    app.bot_data["save_queue"].put_nowait(None)
+    await app.bot_data["save_task"]
+
+async def post_shutdown(app: Application):
+    """Close the async engine (used by llm_cache) once the bot has shut down"""
+    await async_engine.dispose() # pooled aiosqlite connections' worker threads would keep the process alive
+
+
 # --- RUN APP --- #
 def main():
     """Start the bot"""
-    # Create the Application
-    app = Application.builder().token(TELEGRAM_TOKEN).build()
+    # Create the Application (updates handled concurrently so a user's forwards can share a Claude call)
+    app = (
+        Application.builder()
+        .token(get_settings().telegram_token)
+        .concurrent_updates(True)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Add handlers
     app.add_handler(CommandHandler("start", start))
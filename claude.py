@@ -1,184 +1,385 @@
 import os
-import json
 import re
+import asyncio
+import hashlib
+import functools
+from collections import OrderedDict
 from datetime import datetime
-from anthropic import Anthropic
+from typing import List, Optional, Union
+import msgspec
+import httpx
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
 from dotenv import load_dotenv
+import llm_cache
 
 load_dotenv()
-client = Anthropic(api_key=os.getenv("CLAUDE_API_KEY"))
+# One long-lived pooled HTTP/2 connection set: bursts of extractions multiplex over a warm TLS connection
+client = AsyncAnthropic(
+    api_key=os.getenv("CLAUDE_API_KEY"),
+    http_client=DefaultAsyncHttpxClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        timeout=60.0 # default; extraction calls pass their own, sized by _request_timeout()
+    )
+)
 
 MODEL_NAME = "claude-sonnet-4-5-20250929"  # or "claude-3-5-haiku-20241022"?
 MAX_TOKENS = 670 # 67 (~43 messages daily)
+PROMPT_VERSION = "2" # bump when the prompt changes, so cached responses from the old prompt aren't reused
+REQUEST_TIMEOUT_BASE = 30.0 # seconds for connection, queueing and prompt processing
+OUTPUT_TOKENS_PER_SECOND = 25 # conservative generation rate, used to size read timeouts
+EXTRACTION_CACHE_SIZE = 1024 # forwarded messages are often duplicates; skip Claude for repeats
+
+REQUIRED_FIELDS = ("title", "event_type", "date", "synopsis", "deadline", "target_audience")
+
+class EventData(msgspec.Struct, kw_only=True, omit_defaults=True):
+    """
+    Event details extracted by Claude, passed from extraction through cleaning to saving and display.
+    Required fields left missing or empty get a placeholder.
+    """
+    title: Optional[str] = None
+    event_type: Optional[str] = None
+    date: Optional[str] = None
+    location: Optional[str] = None
+    fee: Union[float, str, None] = None
+    signup_link: Optional[str] = None
+    synopsis: Optional[str] = None
+    organisation: Optional[str] = None
+    deadline: Optional[str] = None
+    target_audience: Optional[str] = None
+    key_speakers: Optional[str] = None
+    refreshments: Optional[str] = None
+    contacts: Optional[str] = None
+    event_date_parsed: Optional[datetime] = None # set by clean_event_data
+    parse_error: bool = False # Claude's response couldn't be parsed
+    
+    def __post_init__(self):
+        for field in REQUIRED_FIELDS:
+            if not getattr(self, field):
+                setattr(self, field, "Unknown" if field != "target_audience" else "all students")
+
+_extraction_cache = OrderedDict() # message key (see _message_key) -> EventData (LRU order)
+
+# Static instructions sent ahead of every forwarded message. Not marked for prompt caching: at ~350
+# tokens it is well below the model's minimum cacheable prefix (1024 tokens for Sonnet).
+EXTRACTION_PROMPT = """Extract the event from a university student group message (workshop, hackathon, talk, recruitment, career fair, Q&A, mentorship, networking, meetup, etc.).
+
+Return ONLY a JSON object with these string keys (* = required, never 'TBC'):
+title*: event name, inferred if not explicit
+event_type*: Workshop|Hackathon|Talk|Career_Fair|Recruitment|Mentorship|QA_Session|Networking|Competition|Briefing|Other
+date*: date and time with year, e.g. '22 Oct 2025, 10am-2pm', '8-9 Nov 2025', 'Ongoing'; main date if several
+location: venue, 'Online', 'Hybrid' or 'TBC'
+fee: number, 0 if free or not stated (walk-ins usually 0)
+signup_link: prefer URL > 'Walk-in' > email > Telegram link > 'TBC'; QR code only -> 'TBC'
+synopsis*: 1-2 sentences (mention a QR code if important)
+organisation: organising club/company/agency (e.g. after 'On Behalf of'), or 'TBC'
+deadline*: 'DD MMM YYYY, time'; if not stated, 24h before start (event '23 Oct 2025, 7pm' -> '22 Oct 2025, 7pm'); 'None' if ongoing/rolling
+target_audience*: e.g. 'CS students', 'Startup founders'; 'All students' if unclear
+key_speakers: names, or 'None'
+refreshments: type only ('Dinner provided' -> 'Dinner', 'Free acai' -> 'Acai', 'Light refreshments', 'Snacks'), or 'None'
+contacts: enquiry contacts, comma-separated, platform prefixed and @ kept (e.g. 'Telegram @username'), or 'None'
+
+Newsletters/posts count as the event itself. No text outside the JSON."""
+
+# Appended after EXTRACTION_PROMPT when several messages share one call
+BATCH_PROMPT = """{count} messages below, each prefixed [1], [2], ...
+Extract each separately; return ONLY a JSON array of {count} objects in message order.
+
+"""
+
+def _message_key(message_text: str) -> bytes:
+    """Digest of a message plus everything that shapes Claude's answer, used as the cache key"""
+    return hashlib.sha256((message_text + MODEL_NAME + PROMPT_VERSION).encode()).digest()
 
-def extract_event_details(message_text: str) -> dict:
+async def _cache_get(message_text: str) -> Optional[EventData]:
+    """Return the cached extraction for a message (memory first, then database), if any"""
+    return (await _cache_get_many([message_text]))[0]
+
+async def _cache_get_many(messages: List[str]) -> List[Optional[EventData]]:
+    """Cached extractions for several messages, in order; memory misses share one database query"""
+    keys = [_message_key(message_text) for message_text in messages]
+    results = []
+    for key in keys:
+        cached = _extraction_cache.get(key)
+        if cached is not None:
+            _extraction_cache.move_to_end(key)
+        results.append(cached)
+    
+    misses = [key for key, cached in zip(keys, results) if cached is None]
+    stored = await llm_cache.get_many(misses) if misses else {}
+    for i, key in enumerate(keys):
+        if results[i] is None and key in stored:
+            results[i] = msgspec.convert(stored[key], EventData)
+            _remember(key, results[i])
+    return results
+
+async def _cache_put(message_text: str, event: EventData):
+    """Remember a successful extraction in memory and in the database"""
+    if event.parse_error: # failed parses are retried next time
+        return
+    key = _message_key(message_text)
+    _remember(key, event)
+    await llm_cache.set(key, msgspec.to_builtins(event))
+
+def _remember(key: bytes, event: EventData):
+    """Add to the in-memory LRU, evicting the least recently used entry when full"""
+    _extraction_cache[key] = event
+    if len(_extraction_cache) > EXTRACTION_CACHE_SIZE:
+        _extraction_cache.popitem(last=False)
+
+async def extract_event_details(message_text: str) -> EventData:
     """
     Uses Claude to extract event details from a forwarded message.
     Handles diverse event types: talks, workshops, hackathons, recruitment, career fairs, etc.
+    Results for identical messages are served from an in-memory LRU, backed by the llm_cache table
+    (cached EventData instances are shared, so treat them as read-only; clean_event_data returns a copy).
     
-    Returns a dict with all fields - missing fields marked as 'TBC'.
-    Required fields (title, event_type, date, synopsis, deadline, target_audience) MUST have values.
+    Required fields (title, event_type, date, synopsis, deadline, target_audience) always have values.
     """
+    cached = await _cache_get(message_text)
+    if cached is not None:
+        return cached
+
+    event = await _request_event_details(message_text)
+    await _cache_put(message_text, event)
+    return event
+
+async def extract_event_details_batch(messages: List[str]) -> List[EventData]:
+    """
+    Extract event details for several messages, sharing one Claude call between the uncached ones.
+    Returns one EventData per message, in the same order.
+    Only batch messages from the same user: each message's text is visible to the extraction of the others.
+    """
+    results = await _cache_get_many(messages)
+    pending = list(dict.fromkeys(m for m, event in zip(messages, results) if event is None)) # unique, in order
+    if len(pending) == 1:
+        event = await _request_event_details(pending[0])
+        await _cache_put(pending[0], event)
+        extracted = {pending[0]: event}
+    elif pending:
+        # Not cached: a result from a shared call also depends on the other messages in it
+        extracted = dict(zip(pending, await _request_event_details_batch(pending)))
+    return [
+        event if event is not None else extracted[message_text]
+        for message_text, event in zip(messages, results)
+    ]
+
+def _request_timeout(max_tokens: int) -> float:
+    """
+    Per-request timeout for a call that may generate up to max_tokens.
+    Non-streaming responses send nothing until they are complete, so a fixed read timeout
+    would cut off (and the SDK would then retry) large batch calls.
+    """
+    return REQUEST_TIMEOUT_BASE + max_tokens / OUTPUT_TOKENS_PER_SECOND
+
+async def _request_event_details(message_text: str) -> EventData:
+    """Ask Claude to extract event details from a message (uncached)"""
 
-    prompt = f"""You are an expert at extracting event information from university student group messages.
-
-    These messages include: workshops, hackathons, recruitment drives, career fairs, Q&A sessions, mentorship programs, talks, networking events, and casual meetups.
-
-    Here is a message about an event or activity:
-    {message_text}
-
-    Please extract and return ONLY a valid JSON object with these fields:
-    {{
-        "title": "event name/title - REQUIRED - infer intelligently if not explicit",
-        "event_type": "REQUIRED - one of: Workshop, Hackathon, Talk, Career_Fair, Recruitment, Mentorship, QA_Session, Networking, Competition, Briefing, or Other",
-        "date": "REQUIRED - date and time (e.g., '22 Oct 2025, 10am-2pm' or '8-9 Nov 2025' or 'Ongoing')",
-        "location": "Physical location, 'Online', 'Hybrid', or 'TBC'",
-        "fee": "0 if free, otherwise the amount as a float (e.g. 6.7, 10, 25), or assume free (0) if not specified",
-        "signup_link": "URL to signup/register, 'Walk-in', or 'TBC'",
-        "synopsis": "REQUIRED - 1-2 sentence description of what the event is about",
-        "organisation": "organizing body/club/company (e.g., 'NUS Greyhats', 'DSO', 'Jane Street', 'NUS Fintech Society'), or 'TBC' if not mentioned",
-        "deadline": "REQUIRED - registration/application deadline in format 'DD MMM YYYY, time' OR if not explicitly stated, estimate 24 hours before event start OR 'None' if ongoing/no deadline",
-        "target_audience": "REQUIRED - who it's for (e.g., 'Women and gender-expansive students', 'CS students', 'Startup founders', 'All NUS students') - default to 'All students' if unclear",
-        "key_speakers": "names of notable speakers/guests if mentioned, or 'None'",
-        "refreshments": "type of refreshments if mentioned (e.g., 'Dinner', 'Lunch', 'Light refreshments', 'Snacks', 'Tea'), or 'None' if not mentioned",
-        "contacts": "contact details for enquiries (usually telegram @), if mentioned, or 'None' if not mentioned."
-    }}
-
-    CRITICAL EXTRACTION RULES:
-    1. **Required fields cannot be 'TBC'**: title, event_type, date, synopsis, deadline (estimate if needed), target_audience
-    2. **Optional fields use 'TBC' if missing**: location, signup_link, key_speakers
-    3. **Deadline estimation**: If no explicit deadline, calculate 24 hours before event date
-    - Example: Event on "23 Oct 2025, 7pm" → deadline = "22 Oct 2025, 7pm"
-    - If event is "Ongoing" or rolling recruitment → deadline = "None"
-    4. **Target audience defaults**: If unclear → "All students"
-    5. **Refreshments detection**: Look for keywords and extract the TYPE: "Dinner provided" → "Dinner", "Light refreshments" → "Light refreshments", "Snacks" → "Snacks", "Free acai" → "Acai", "Networking dinner" → "Dinner", etc. If nothing mentioned → "None"
-    6. **Signup link priority**: Direct URL > Walk-in > Email > Telegram link > 'TBC'
-    7. **Date format**: Always include year (2025 or 2026) for clarity
-    8. **Organisation detection**: Look for organizing body - could be prefixed with "On Behalf of", company names, student clubs, government agencies, etc.
-    9. **Contacts extraction**: Look for any contact details provided for enquiries (usually Telegram handles, e.g., @username). If none mentioned, set to "None". If more than one handle is provided, include all separated by commas. In front of each handle, include the platform if mentioned (e.g., Telegram @username), and retain the @ symbol for Telegram handles.
-
-    Handle edge cases:
-    - "Walk in anytime" → signup_link is "Walk-in", fee usually 0
-    - Multiple dates → extract the main event date(s)
-    - QR code mentions → signup_link = "TBC" (mention QR in synopsis if important)
-    - Meta-events (newsletters) → extract the newsletter/post itself as the event
-
-    Return ONLY valid JSON, nothing else."""
-
-    # Generate response
-    response = client.messages.create(
+    # Generate response (awaited, so the bot keeps serving other users meanwhile)
+    response = await client.messages.create(
         model=MODEL_NAME,
         max_tokens=MAX_TOKENS,
-        messages=[{"role": "user", "content": prompt}]
+        timeout=_request_timeout(MAX_TOKENS),
+        messages=[{"role": "user", "content": [
+            {"type": "text", "text": EXTRACTION_PROMPT},
+            {"type": "text", "text": "Here is the message:\n" + message_text},
+        ]}, {"role": "assistant", "content": "{"}] # prefilled, so the reply is bare JSON (no code fence)
     )
-    response_text = response.content[0].text.strip()
-
-    # Clean up response
-    if response_text.startswith("```"):
-        response_text = response_text.split("```")[1]
-        if response_text.startswith("json"):
-            response_text = response_text[4:]
-        response_text = response_text.strip()
-    
+    response_text = "{" + response.content[0].text
+
+    try:
+        return _decode_event(response_text)
+    except (msgspec.DecodeError, msgspec.ValidationError) as e:
+        print(f"⚠️ Claude response wasn't a valid event ({e}): {response_text[:200]}")
+        return _parse_failure(message_text)
+
+async def _request_event_details_batch(messages: List[str]) -> List[EventData]:
+    """Ask Claude to extract several messages in one call; falls back to one call per message"""
+    numbered = "\n\n".join(f"[{i}] {message_text}" for i, message_text in enumerate(messages, 1))
+    max_tokens = MAX_TOKENS * len(messages)
+    response = await client.messages.create(
+        model=MODEL_NAME,
+        max_tokens=max_tokens,
+        timeout=_request_timeout(max_tokens),
+        messages=[{"role": "user", "content": [
+            {"type": "text", "text": EXTRACTION_PROMPT},
+            {"type": "text", "text": BATCH_PROMPT.format(count=len(messages)) + numbered},
+        ]}, {"role": "assistant", "content": "["}]
+    )
+    response_text = "[" + response.content[0].text
+
     try:
-        event_data = json.loads(response_text)
-        # Validate required fields are present
-        required_fields = ["title", "event_type", "date", "synopsis", "deadline", "target_audience"]
-        for field in required_fields:
-            if field not in event_data or not event_data[field]:
-                event_data[field] = "Unknown" if field != "target_audience" else "all students"
-        
-        return event_data
+        extracted = msgspec.json.decode(response_text, type=List[msgspec.Raw]) # elements decoded one by one below
+    except (msgspec.DecodeError, msgspec.ValidationError):
+        extracted = None
+    if extracted is None or len(extracted) != len(messages):
+        print(f"⚠️ Batch response didn't match {len(messages)} messages, retrying individually")
+        return list(await asyncio.gather(*(_request_event_details(m) for m in messages)))
+
+    results = []
+    for message_text, raw in zip(messages, extracted):
+        try:
+            results.append(_decode_event(raw))
+        except (msgspec.DecodeError, msgspec.ValidationError):
+            results.append(_parse_failure(message_text))
+    return results
+
+def _decode_event(response_json) -> EventData:
+    """Decode and validate one event object (str/bytes JSON or msgspec.Raw)"""
+    return msgspec.json.decode(response_json, type=EventData)
+
+def _parse_failure(message_text: str) -> EventData:
+    """Minimal valid event returned when Claude's response can't be parsed"""
+    return EventData(
+        title="Unable to parse event",
+        event_type="other",
+        date="TBC",
+        location="TBC",
+        fee="TBC",
+        signup_link="TBC",
+        synopsis="Could not automatically extract event details. Please view original message.",
+        organisation="TBC",
+        deadline="TBC",
+        target_audience="all students",
+        key_speakers="None",
+        refreshments="None",
+        contacts="None",
+        parse_error=True
+    )
+
+# Common date formats in events; only the part before the first comma is parsed,
+# so formats that share that part collapse into a single strptime attempt
+_DATE_FORMATS = tuple(dict.fromkeys(fmt.split(',')[0] for fmt in [
+    "%d %b %Y, %I:%M %p",  # "4 Nov 2025, 5:30 PM"
+    "%d %b %Y",  # "4 Nov 2025"
+    "%d %b, %I:%M %p",  # "4 Nov, 5:30 PM" (assume current year)
+]))
+_DATE_RANGE_RE = re.compile(r"^(\d{1,2})-\d{1,2}(?= )")  # "8-9 Nov 2025" -> "8 Nov 2025" (strptime can't repeat %d)
+
+# Fast path for the common "4 Nov 2025" / "8-9 Nov 2025" / "4 Nov" shapes; strptime is the fallback
+_FAST_DATE_RE = re.compile(r"^(\d{1,2})(?:-\d{1,2})?\s+([A-Za-z]{3})(?:\s+(\d{4}))?$")
+_HAS_DIGIT = re.compile(r"\d").search # every accepted format has a day number
+_MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_event_date(date_str: str) -> Optional[datetime]:
+    """
+    Attempt to parse various date formats from event dates.
+    Returns None if parsing fails.
+    Results are cached, since the same date strings recur across events.
+    """
+    if not date_str or not _HAS_DIGIT(date_str): # 'TBC', 'Ongoing', 'None', 'Every Friday', ...
+        return None
+    
+    head = date_str.split(',', 1)[0].strip()
+    match = _FAST_DATE_RE.match(head)
+    if match:
+        day, month, year = match.groups()
+        month = _MONTHS.get(month.lower())
+        if month:
+            try:
+                # If year not in string, assume current year
+                return datetime(int(year) if year else datetime.now().year, month, int(day))
+            except ValueError:  # e.g. "31 Feb 2025"
+                return None
+    
+    head = _DATE_RANGE_RE.sub(r"\1", head)
+    for fmt in _DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(head, fmt)
+            # If year not in string, assume current year
+            if parsed.year == 1900:
+                parsed = parsed.replace(year=datetime.now().year)
+            return parsed
+        except ValueError:
+            continue
     
-    except json.JSONDecodeError:
-        print(f"⚠️ Claude response wasn't valid JSON: {response_text[:200]}")
-        # Return minimal valid structure on parse failure
-        return {
-            "title": "Unable to parse event",
-            "event_type": "other",
-            "date": "TBC",
-            "location": "TBC",
-            "fee": "TBC",
-            "signup_link": "TBC",
-            "synopsis": "Could not automatically extract event details. Please view original message.",
-            "organisation": "TBC",
-            "deadline": "TBC",
-            "target_audience": "all students",
-            "key_speakers": "None",
-            "refreshments": "None",
-            "contacts": "None",
-            "raw_message": message_text,
-            "parse_error": True
-        }
-
-def clean_event_data(event_data: dict) -> dict:
+    return None
+
+_FREE_FEES = frozenset({'free', '0'})
+_UNKNOWN_FEES = frozenset({'tbc'})
+_FEE_NUMBER_RE = re.compile(r'\d+\.?\d*')
+
+def clean_event_data(event: EventData) -> EventData:
     """
     Clean and standardize event data before saving to database.
-    Applies formatting rules consistently.
+    Applies formatting rules consistently; returns a new EventData.
     """
-    cleaned = event_data.copy()
-    if 'title' in cleaned: # Remove markdown from title
-        cleaned['title'] = cleaned['title'].replace('**', '').replace('*', '').strip()
-    if 'event_type' in cleaned:
-        cleaned['event_type'] = cleaned['event_type'].capitalize()
-    if 'refreshments' in cleaned: 
-        cleaned['refreshments'] = cleaned['refreshments'].capitalize()
+    title = event.title.replace('**', '').replace('*', '').strip() # Remove markdown from title
+    refreshments = event.refreshments.capitalize() if event.refreshments is not None else None
 
     # Convert fee to proper format (handle "free" -> 0, "TBC" -> None)
-    fee = cleaned.get('fee')
-    if fee in ['free', 'Free', 'FREE', 0, '0', 0.0]:
-        cleaned['fee'] = 0.0
-    elif fee in ['TBC', 'tbc', None]:
-        cleaned['fee'] = None
-    elif isinstance(fee, (int, float)):
-        cleaned['fee'] = float(fee)
-    elif isinstance(fee, str): # If it's a string like "$10.50" or "12.5", try to extract number
-        match = re.search(r'\d+\.?\d*', fee)
-        cleaned['fee'] = float(match.group()) if match else None
+    fee = event.fee
+    if isinstance(fee, str):
+        normalized = fee.strip().lower()
+        if normalized in _FREE_FEES:
+            fee = 0.0
+        elif normalized in _UNKNOWN_FEES:
+            fee = None
+        else: # If it's a string like "$10.50" or "12.5", try to extract number
+            match = _FEE_NUMBER_RE.search(fee)
+            fee = float(match.group()) if match else None
+    elif fee is not None:
+        fee = float(fee)
     
-    return cleaned
+    return msgspec.structs.replace(
+        event,
+        title=title,
+        event_type=event.event_type.capitalize(),
+        refreshments=refreshments,
+        fee=fee,
+        event_date_parsed=parse_event_date(event.date), # stored for indexed date filtering
+    )
 
-def format_event_for_display(event_data: dict) -> str:
+_DISPLAY_TEMPLATE = (
+    "📌 {title}\n"
+    "🏷️ Type: {event_type}\n"
+    "📅 Date: {date}\n"
+    "📍 Location: {location}\n"
+    "📝 Synopsis: {synopsis}"
+)
+def format_event_for_display(event: EventData) -> str:
     """Format extracted event data into a readable Telegram message"""
-    result = f"""
-📌 {event_data.get('title', 'Untitled')}
-🏷️ Type: {event_data.get('event_type', 'other')}
-📅 Date: {event_data.get('date', 'TBC')}
-📍 Location: {event_data.get('location', 'TBC')}
-📝 Synopsis: {event_data.get('synopsis', 'TBC')}"""
+    if event.parse_error:
+        lines = ["⚠️ Had trouble parsing this message automatically. I've saved what I could extract.\n"]
+    else:
+        lines = ["✅ Event details extracted successfully!\n"]
+    lines.append(_DISPLAY_TEMPLATE.format(
+        title=event.title or 'Untitled',
+        event_type=event.event_type or 'other',
+        date=event.date or 'TBC',
+        location=event.location or 'TBC',
+        synopsis=event.synopsis or 'TBC',
+    ))
     
     # --- Add optional fields if they have values --- #
     # Add org
-    org = event_data.get('organisation', 'TBC')
-    if org and org != 'TBC':
-        result += f"\n🏢 Organised by: {org}"
+    if event.organisation and event.organisation != 'TBC':
+        lines.append(f"🏢 Organised by: {event.organisation}")
     
     # Add fees
-    fee = event_data.get('fee')
-    if fee != 0.0:
-        result += f"\n💰 Fee: {fee}"
+    if event.fee != 0.0:
+        lines.append(f"💰 Fee: {event.fee}")
 
     # Add signup link
-    signup = event_data.get('signup_link', 'TBC')
-    if signup and signup not in ['TBC', 'None']:
-        if signup.startswith('http'):
-            result += f"\n🔗 Sign up: {signup}"
+    signup = event.signup_link
+    if signup and signup not in ['TBC', 'None'] and signup.startswith('http'):
+        lines.append(f"🔗 Sign up: {signup}")
 
     # Add target audience if not default
-    if event_data.get('target_audience') and event_data['target_audience'] != 'All students':
-        result += f"\n👥 For: {event_data['target_audience']}"
+    if event.target_audience and event.target_audience != 'All students':
+        lines.append(f"👥 For: {event.target_audience}")
     
     # Add refreshments
-    if event_data.get('refreshments') and event_data['refreshments'] not in ['None', 'No']:
-        result += f"\n🍽️ Refreshments: {event_data['refreshments']}"
+    if event.refreshments and event.refreshments not in ['None', 'No']:
+        lines.append(f"🍽️ Refreshments: {event.refreshments}")
     
     # Add key speakers
-    if event_data.get('key_speakers') and event_data['key_speakers'] != 'None':
-        result += f"\n🎤 Speakers: {event_data['key_speakers']}"
-
-    if event_data.get("parse_error"):
-        result = "⚠️ Had trouble parsing this message automatically. I've saved what I could extract.\n" + result
-    else:
-        result = "✅ Event details extracted successfully!\n" + result
+    if event.key_speakers and event.key_speakers != 'None':
+        lines.append(f"🎤 Speakers: {event.key_speakers}")
     
-    return result
\ No newline at end of file
+    return "\n".join(lines)
@@ -1,46 +1,102 @@
 import os
 import secrets
+import threading
 from datetime import datetime, timezone, timedelta
+from typing import TYPE_CHECKING, List
+import orjson
+import zstandard
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Text, DateTime, Boolean, Float
+from sqlalchemy import create_engine, func, insert, text, update, Column, Index, Integer, BigInteger, String, Text, DateTime, Boolean, Float, LargeBinary, JSON
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, defer, sessionmaker
+from sqlalchemy.types import TypeDecorator
+if TYPE_CHECKING:
+    from claude import EventData # claude.py imports this module (via llm_cache), so only for annotations
 
 
 # --- DATABASE SETUP --- #
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+def get_async_url(url: str): # same database, asyncio driver (used by the API)
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+# Connection pool settings (server databases only; SQLite keeps SQLAlchemy's defaults)
+POOL_OPTIONS = {"pool_size": 10, "max_overflow": 20, "pool_pre_ping": True, "pool_recycle": 300}
+def get_engine_options(url: str) -> dict:
+    return {} if make_url(url).get_backend_name() == "sqlite" else POOL_OPTIONS
+
 load_dotenv()
-engine = create_engine(os.getenv("DATABASE_URL"))
+DATABASE_URL = os.getenv("DATABASE_URL")
+engine = create_engine(DATABASE_URL, **get_engine_options(DATABASE_URL)) # sync engine: bot & scripts
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_async_engine(get_async_url(DATABASE_URL), **get_engine_options(DATABASE_URL)) # async engine: API
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 TOKEN_EXPIRY = 5 # minutes until token for web access expires
-SGT = timezone(timedelta(hours=8)) # defaults to SGT
+SGT_OFFSET = timedelta(hours=8)
+SGT = timezone(SGT_OFFSET) # defaults to SGT
 def get_sgt_now(): # get current time in SGT
     return datetime.now(SGT)
+_utcnow = datetime.utcnow
+def get_sgt_now_naive(): # current SGT wall time without tzinfo, for naive DateTime columns (no tzinfo wrap/unwrap)
+    return _utcnow() + SGT_OFFSET
+
+
+# --- COMPRESSED TEXT --- #
+ZSTD_LEVEL = 3
+_zstd = threading.local() # zstd contexts aren't safe to share between threads (bot worker threads, API loop)
+
+def compress_text(text: str) -> bytes:
+    compressor = getattr(_zstd, "compressor", None)
+    if compressor is None:
+        compressor = _zstd.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    return compressor.compress(text.encode("utf-8"))
+
+def decompress_text(data: bytes) -> str:
+    decompressor = getattr(_zstd, "decompressor", None)
+    if decompressor is None:
+        decompressor = _zstd.decompressor = zstandard.ZstdDecompressor()
+    return decompressor.decompress(data).decode("utf-8")
+
+
+class CompressedText(TypeDecorator):
+    """Text stored zstd-compressed in a binary column; reads and writes see plain str"""
+    impl = LargeBinary
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        return compress_text(value) if value is not None else None
+    
+    def process_result_value(self, value, dialect):
+        return decompress_text(value) if value is not None else None
 
 
 # --- DATABASE MODELS --- #
 class AuthToken(Base):
     """One-time authentication tokens for web access"""
     __tablename__ = "auth_tokens"
+    __table_args__ = (
+        # Expiry checks / cleanup only ever look at unused tokens, so only those are indexed
+        Index("ix_authtokens_active", "expires_at", postgresql_where=text("NOT used"), sqlite_where=text("NOT used")),
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
-    token = Column(String(64), unique=True, nullable=False, index=True)
+    token = Column(String(43), primary_key=True) # secrets.token_urlsafe(32); every lookup is by token, so it is the key
     user_id = Column(BigInteger, nullable=False)
     username = Column(String(255))
     used = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=get_sgt_now)
-    expires_at = Column(DateTime, nullable=False)
-    
-    def is_valid(self):
-        """Check if token is still valid"""
-        now = datetime.now(SGT).replace(tzinfo=None)  # Remove timezone info for comparison
-        expires_at = self.expires_at.replace(tzinfo=None) if self.expires_at.tzinfo else self.expires_at
-        return not self.used and now < self.expires_at
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False) # computed in Python from the per-token TTL
 
 
 class Event(Base):
     """Event model for storing extracted event details"""
     __tablename__ = "events"
+    __table_args__ = (
+        # Serves the per-user pending/interested lists: index range scan, already in date_created order
+        Index("ix_events_user_pending", "user_id", "user_interested", "date_created"),
+    )
     
     # Primary key
     id = Column(Integer, primary_key=True, index=True)
@@ -53,6 +109,7 @@ class Event(Base):
     title = Column(String(500), nullable=False)
     event_type = Column(String(100), nullable=False)
     date = Column(String(200), nullable=False)
+    event_date_parsed = Column(DateTime, index=True)  # parsed from `date` at save time; None if unparseable
     location = Column(String(500))
     synopsis = Column(Text, nullable=False)
     organisation = Column(String(300))
@@ -64,112 +121,125 @@ class Event(Base):
     key_speakers = Column(Text)
     contacts = Column(Text)
     
-    # Raw message for reference
-    raw_message = Column(Text, nullable=False)
+    # Raw message for reference (zstd-compressed; forwarded newsletters can be many KB and are rarely read)
+    raw_message = Column(CompressedText, nullable=False)
+    
+    # API response JSON for the fields above that never change after insert (see RESPONSE_JSON_FIELDS)
+    response_json = Column(LargeBinary, nullable=False)
     
     # User interaction tracking
     user_interested = Column(Boolean, default=None)  # None = not swiped, True = interested, False = not interested
     
     # Metadata
-    date_created = Column(DateTime, default=get_sgt_now()) # store in SGT
+    date_created = Column(DateTime(timezone=True), server_default=func.now(), nullable=False) # set by the database on insert
     parse_error = Column(Boolean, default=False)
     
     def __repr__(self):
         return f"<Event(id={self.id}, title='{self.title}', user_id={self.user_id})>"
 
 
+class LlmCache(Base):
+    """Persistent cache of Claude extraction responses (see llm_cache.py)"""
+    __tablename__ = "llm_cache"
+    
+    hash = Column(LargeBinary(32), primary_key=True)  # sha256 of message + model + prompt version
+    response = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=get_sgt_now_naive)
+    expires_at = Column(DateTime, nullable=False, index=True) # pruned periodically by llm_cache.set()
+
+
 def init_db():
     """Initialize database - creates all tables"""
     Base.metadata.create_all(bind=engine)
     print("✅ Database tables created successfully")
 
 
-def get_db():
-    """Get database session (for FastAPI dependency injection)"""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Get async database session (for FastAPI dependency injection)"""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+# Event fields serialized once at insert time into Event.response_json;
+# id, user_interested and date_created are added when the event is read
+RESPONSE_JSON_FIELDS = (
+    "user_id", "username", "title", "event_type", "date", "location", "synopsis", "organisation",
+    "fee", "signup_link", "deadline", "target_audience", "refreshments", "key_speakers",
+)
 
 
 # Database operations
-def save_event(event_data: dict, user_id: int, username: str, raw_message: str) -> Event:
-    """Save an extracted event to the database"""
-    db = SessionLocal()
+def build_event_row(event: "EventData", user_id: int, username: str, raw_message: str) -> dict:
+    """Map extracted event data (claude.EventData, after clean_event_data) to Event column values"""
+    row = {
+        "user_id": user_id,
+        "username": username,
+        "title": event.title,
+        "event_type": event.event_type,
+        "date": event.date,
+        "event_date_parsed": event.event_date_parsed,
+        "location": event.location,
+        "synopsis": event.synopsis,
+        "organisation": event.organisation,
+        "fee": event.fee,
+        "signup_link": event.signup_link,
+        "deadline": event.deadline,
+        "target_audience": event.target_audience,
+        "refreshments": event.refreshments,
+        "key_speakers": event.key_speakers,
+        "contacts": event.contacts,
+        "raw_message": raw_message,
+        "parse_error": event.parse_error
+    }
+    row["response_json"] = orjson.dumps({field: row[field] for field in RESPONSE_JSON_FIELDS})
+    return row
+
+
+def save_event(db: Session, event: "EventData", user_id: int, username: str, raw_message: str) -> int:
+    """Save an extracted event to the database, returning its ID"""
+    return save_events_bulk(db, [build_event_row(event, user_id, username, raw_message)])[0]
+
+
+def save_events_bulk(db: Session, rows: List[dict]) -> List[int]:
+    """Insert many event rows (from build_event_row) in one INSERT ... RETURNING + commit; returns IDs in row order"""
     try:
-        event = Event(
-            user_id=user_id,
-            username=username,
-            title=event_data.get('title'),
-            event_type=event_data.get('event_type'),
-            date=event_data.get('date'),
-            location=event_data.get('location'),
-            synopsis=event_data.get('synopsis'),
-            organisation=event_data.get('organisation'),
-            fee=event_data.get('fee'),
-            signup_link=event_data.get('signup_link'),
-            deadline=event_data.get('deadline'),
-            target_audience=event_data.get('target_audience'),
-            refreshments=event_data.get('refreshments'),
-            key_speakers=event_data.get('key_speakers'),
-            contacts=event_data.get('contacts'),
-            raw_message=raw_message,
-            parse_error=event_data.get('parse_error', False)
-        )
-        
-        db.add(event)
+        result = db.execute(insert(Event).returning(Event.id, sort_by_parameter_order=True), rows)
+        ids = list(result.scalars())
         db.commit()
-        db.refresh(event)
-        
-        print(f"✅ Event saved to database: ID={event.id}")
-        return event
+        print(f"✅ {len(ids)} event(s) saved to database")
+        return ids
         
     except Exception as e:
         db.rollback()
-        print(f"❌ Error saving event: {e}")
+        print(f"❌ Error saving events: {e}")
         raise
-    finally:
-        db.close()
 
 
-def get_user_events(user_id: int):
-    """Get all events submitted by a user"""
-    db = SessionLocal()
-    try:
-        events = db.query(Event).filter(Event.user_id == user_id).order_by(Event.date_created.desc()).all()
-        return events
-    finally:
-        db.close()
+def get_user_events(db: Session, user_id: int, include_raw: bool = False):
+    """Get all events submitted by a user (raw_message is only loaded if requested)"""
+    query = db.query(Event).filter(Event.user_id == user_id)
+    if not include_raw:
+        query = query.options(defer(Event.raw_message))
+    return query.order_by(Event.date_created.desc()).all()
 
 
-def get_event_by_id(event_id: int):
+def get_event_by_id(db: Session, event_id: int):
     """Get a specific event by ID"""
-    db = SessionLocal()
-    try:
-        event = db.query(Event).filter(Event.id == event_id).first()
-        return event
-    finally:
-        db.close()
+    return db.get(Event, event_id)
 
 
-def update_event_interest(event_id: int, interested: bool):
+def update_event_interest(db: Session, event_id: int, interested: bool):
     """Update user's interest in an event (for swipe functionality)"""
-    db = SessionLocal()
-    try:
-        event = db.query(Event).filter(Event.id == event_id).first()
-        if event:
-            event.user_interested = interested
-            db.commit()
-            print(f"✅ Event {event_id} interest updated: {interested}")
-        return event
-    finally:
-        db.close()
+    event = db.get(Event, event_id)
+    if event:
+        event.user_interested = interested
+        db.commit()
+        print(f"✅ Event {event_id} interest updated: {interested}")
+    return event
 
 
-def create_auth_token(user_id: int, username: str, expires_minutes: int = TOKEN_EXPIRY) -> str:
+def create_auth_token(db: Session, user_id: int, username: str, expires_minutes: int = TOKEN_EXPIRY) -> str:
     """Create a one-time authentication token for web access"""
-    db = SessionLocal()
     try:
         token = secrets.token_urlsafe(32)
         expires_at = get_sgt_now() + timedelta(minutes=expires_minutes)
@@ -191,33 +261,27 @@ def create_auth_token(user_id: int, username: str, expires_minutes: int = TOKEN_
         print(f"❌ Error creating token: {e}")
         raise
 
-    finally:
-        db.close()
 
-
-def validate_and_use_token(token: str):
+async def validate_and_use_token(db: AsyncSession, token: str):
     """Validate a token and mark it as used. Returns user info if valid."""
-    db = SessionLocal()
-    try:
-        auth_token = db.query(AuthToken).filter(AuthToken.token == token).first()
-        
-        if not auth_token:
-            return None
-        
-        if not auth_token.is_valid():
-            return None
-        
-        # Mark token as used
-        auth_token.used = True
-        db.commit()
-        
-        return {
-            "user_id": auth_token.user_id,
-            "username": auth_token.username
-        }
-        
-    finally:
-        db.close()
+    # One atomic UPDATE ... RETURNING: concurrent validations of the same token are serialised
+    # by the row lock, so only one of them can flip `used` and succeed
+    result = await db.execute(
+        update(AuthToken)
+        .where(AuthToken.token == token, AuthToken.used == False, AuthToken.expires_at > get_sgt_now())
+        .values(used=True)
+        .returning(AuthToken.user_id, AuthToken.username)
+    )
+    auth_token = result.first()
+    await db.commit()
+    
+    if not auth_token:
+        return None
+    
+    return {
+        "user_id": auth_token.user_id,
+        "username": auth_token.username
+    }
 
 
 if __name__ == "__main__":
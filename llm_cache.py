@@ -0,0 +1,60 @@
+import os
+import time
+from datetime import timedelta
+from typing import Dict, Iterable, Optional
+from dotenv import load_dotenv
+from sqlalchemy import delete, select
+from database import AsyncSessionLocal, LlmCache, get_sgt_now_naive
+
+# Persistent cache of Claude responses, so identical messages forwarded again (even after a
+# restart) skip the API call. Keys are sha256 digests built by the caller (see claude.py).
+
+load_dotenv()
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PRUNE_INTERVAL = 3600 # seconds between deletes of expired entries (piggybacked on set())
+
+_last_pruned: Optional[float] = None # monotonic time of the last prune; the first set() prunes
+
+
+async def get(prompt_hash: bytes) -> Optional[dict]:
+    """Return the cached response for a prompt hash, or None if missing/expired"""
+    return (await get_many([prompt_hash])).get(prompt_hash)
+
+
+async def get_many(prompt_hashes: Iterable[bytes]) -> Dict[bytes, dict]:
+    """Return the cached responses for several prompt hashes in one query (missing/expired ones are left out)"""
+    prompt_hashes = list(prompt_hashes)
+    if not LLM_CACHE_ENABLED or not prompt_hashes:
+        return {}
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(LlmCache.hash, LlmCache.response)
+                .where(LlmCache.hash.in_(prompt_hashes), LlmCache.expires_at > get_sgt_now_naive())
+            )
+            return {bytes(prompt_hash): response for prompt_hash, response in result}
+    except Exception as e: # the cache is an optimisation; never fail an extraction because of it
+        print(f"⚠️ LLM cache lookup failed: {e}")
+        return {}
+
+
+async def set(prompt_hash: bytes, response: dict, ttl_days: int = 7):
+    """Store (or refresh) the response for a prompt hash, pruning expired entries every PRUNE_INTERVAL"""
+    global _last_pruned
+    if not LLM_CACHE_ENABLED:
+        return
+    now = get_sgt_now_naive()
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.merge(LlmCache(
+                hash=prompt_hash,
+                response=response,
+                created_at=now,
+                expires_at=now + timedelta(days=ttl_days)
+            ))
+            if _last_pruned is None or time.monotonic() - _last_pruned > PRUNE_INTERVAL:
+                await db.execute(delete(LlmCache).where(LlmCache.expires_at <= now))
+                _last_pruned = time.monotonic()
+            await db.commit()
+    except Exception as e:
+        print(f"⚠️ LLM cache write failed: {e}")
@@ -1,24 +1,31 @@
+import sys
+from sqlalchemy import func
 from database import SessionLocal, Event
 
 db = SessionLocal()
 
-# Get all events
-events = db.query(Event).all()
+print(f"📊 Total events in database: {db.query(func.count(Event.id)).scalar()}\n")
 
-print(f"📊 Total events in database: {len(events)}\n")
+# Stream only the printed columns (raw_message is never loaded), 500 rows at a time
+events = db.query(
+    Event.id, Event.title, Event.event_type, Event.date, Event.location, Event.fee,
+    Event.organisation, Event.deadline, Event.username, Event.user_id, Event.date_created
+).yield_per(500)
 
 for event in events:
-    print(f"{'='*60}")
-    print(f"ID: {event.id}")
-    print(f"Title: {event.title}")
-    print(f"Type: {event.event_type}")
-    print(f"Date: {event.date}")
-    print(f"Location: {event.location}")
-    print(f"Fee: ${event.fee if event.fee else 'Free'}")
-    print(f"Organisation: {event.organisation}")
-    print(f"Deadline: {event.deadline}")
-    print(f"User: {event.username} (ID: {event.user_id})")
-    print(f"Created: {event.date_created}")
-    print()
+    sys.stdout.write(
+        f"{'='*60}\n"
+        f"ID: {event.id}\n"
+        f"Title: {event.title}\n"
+        f"Type: {event.event_type}\n"
+        f"Date: {event.date}\n"
+        f"Location: {event.location}\n"
+        f"Fee: ${event.fee if event.fee else 'Free'}\n"
+        f"Organisation: {event.organisation}\n"
+        f"Deadline: {event.deadline}\n"
+        f"User: {event.username} (ID: {event.user_id})\n"
+        f"Created: {event.date_created}\n"
+        f"\n"
+    )
 
-db.close()
\ No newline at end of file
+db.close()